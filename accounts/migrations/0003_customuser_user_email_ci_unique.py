@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:57
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    CustomUser.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_customuser_managers_remove_customuser_username_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_ci_unique'),
+        ),
+    ]
@@ -7,10 +7,20 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'first_name', 'last_name', 'date_joined')
         read_only_fields = ('id', 'email', 'date_joined')  # These fields can't be modified via API 
 
+    def update(self, instance, validated_data):
+        # Only write the columns that were actually sent
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'email', 'first_name', 'last_name', 'password']
         extra_kwargs = {
             'password': {'write_only': True}
-        } 
\ No newline at end of file
+        }
+
+    def validate_email(self, value):
+        return value.lower() 
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='contact',
+            constraint=models.CheckConstraint(condition=models.Q(('user', models.F('contact')), _negated=True), name='no_self_contact'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0002_contact_no_self_contact'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='contactrequest',
+            constraint=models.CheckConstraint(condition=models.Q(('from_user', models.F('to_user')), _negated=True), name='cr_no_self'),
+        ),
+    ]
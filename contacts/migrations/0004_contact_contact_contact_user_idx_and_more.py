@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0003_contactrequest_cr_no_self'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['contact', 'user'], name='contact_contact_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['to_user', '-created_at'], name='cr_pending_to_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['from_user', '-created_at'], name='cr_pending_from_user_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
@@ -18,16 +18,21 @@ class Contact(models.Model):
     class Meta:
         unique_together = ['user', 'contact']
         ordering = ['-created_at']
+        indexes = [
+            # unique_together covers (user, contact); this serves lookups
+            # of the reverse pair
+            models.Index(fields=['contact', 'user'], name='contact_contact_user_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(user=models.F('contact')),
+                name='no_self_contact'
+            ),
+        ]
 
     def clean(self):
         if self.user == self.contact:
             raise ValidationError("A user cannot be their own contact.")
-        if Contact.objects.filter(user=self.contact, contact=self.user).exists():
-            raise ValidationError("This contact relationship already exists.")
-
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.email} - {self.contact.email}"
@@ -60,6 +65,26 @@ class ContactRequest(models.Model):
     class Meta:
         unique_together = ['from_user', 'to_user']
         ordering = ['-created_at']
+        indexes = [
+            # Back the received/sent listings, which only ever show pending
+            # requests, newest first
+            models.Index(
+                fields=['to_user', '-created_at'],
+                condition=models.Q(status='pending'),
+                name='cr_pending_to_user_idx'
+            ),
+            models.Index(
+                fields=['from_user', '-created_at'],
+                condition=models.Q(status='pending'),
+                name='cr_pending_from_user_idx'
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(from_user=models.F('to_user')),
+                name='cr_no_self'
+            ),
+        ]
 
     def clean(self):
         if self.from_user == self.to_user:
@@ -73,21 +98,17 @@ class ContactRequest(models.Model):
         ).exists():
             raise ValidationError("A pending request already exists between these users.")
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     def accept(self):
         if self.status == 'pending':
-            self.status = 'accepted'
-            self.save()
-            # Create the contact relationship if it doesn't exist
-            # From user -> to user
-            if not Contact.objects.filter(user=self.from_user, contact=self.to_user).exists():
-                Contact.objects.create(user=self.from_user, contact=self.to_user)
-            # To user -> from user
-            if not Contact.objects.filter(user=self.to_user, contact=self.from_user).exists():
-                Contact.objects.create(user=self.to_user, contact=self.from_user)
+            with transaction.atomic():
+                self.status = 'accepted'
+                self.save()
+                # Create both directions of the contact relationship in one
+                # INSERT; unique_together turns already existing rows into no-ops.
+                Contact.objects.bulk_create([
+                    Contact(user_id=self.from_user_id, contact_id=self.to_user_id),
+                    Contact(user_id=self.to_user_id, contact_id=self.from_user_id),
+                ], ignore_conflicts=True)
 
     def reject(self):
         if self.status == 'pending':
@@ -2,11 +2,20 @@ from rest_framework import serializers
 from .models import Contact, ContactRequest
 from accounts.models import CustomUser
 
+
+def user_dict(u):
+    return {'id': u.pk, 'email': u.email, 'first_name': u.first_name, 'last_name': u.last_name}
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'email', 'first_name', 'last_name']
 
+    def to_representation(self, instance):
+        # Fixed, read-only shape: skip the per-field machinery
+        return user_dict(instance)
+
 class ContactSerializer(serializers.ModelSerializer):
     contact = UserSerializer(read_only=True)
     contact_id = serializers.PrimaryKeyRelatedField(
@@ -15,23 +24,35 @@ class ContactSerializer(serializers.ModelSerializer):
         source='contact'
     )
     user = UserSerializer(read_only=True)
-    other_user = serializers.SerializerMethodField()
 
     class Meta:
         model = Contact
-        fields = ['id', 'contact', 'contact_id', 'user', 'other_user', 'created_at']
+        fields = ['id', 'contact', 'contact_id', 'user', 'created_at']
         read_only_fields = ['user', 'created_at']
 
-    def get_other_user(self, obj):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # If the requesting user is the contact, show the user
-            if request.user == obj.contact:
-                return UserSerializer(obj.user).data
-            # If the requesting user is the user, show the contact
-            elif request.user == obj.user:
-                return UserSerializer(obj.contact).data
-        return None
+        self._request_user_id = (
+            request.user.pk if request and request.user.is_authenticated else None
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # other_user is whichever side isn't the requesting user; reuse the
+        # nested representation already built for that side
+        if self._request_user_id == instance.contact_id:
+            data['other_user'] = data['user']
+        elif self._request_user_id == instance.user_id:
+            data['other_user'] = data['contact']
+        else:
+            data['other_user'] = None
+        return data
+
+    def validate_contact_id(self, value):
+        if value == self.context['request'].user:
+            raise serializers.ValidationError("A user cannot be their own contact.")
+        return value
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
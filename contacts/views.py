@@ -1,22 +1,49 @@
+import logging
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, views
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from .models import Contact, ContactRequest
 from .serializers import ContactSerializer, ContactRequestSerializer
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from accounts.models import CustomUser
 
+logger = logging.getLogger(__name__)
+
+# Columns actually rendered by the contact serializers; the joined users
+# otherwise drag along password hashes, permission flags, etc.
+CONTACT_COLUMNS = (
+    'id', 'created_at',
+    'user__id', 'user__email', 'user__first_name', 'user__last_name',
+    'contact__id', 'contact__email', 'contact__first_name', 'contact__last_name',
+)
+CONTACT_REQUEST_COLUMNS = (
+    'id', 'status', 'created_at', 'updated_at',
+    'from_user__id', 'from_user__email', 'from_user__first_name', 'from_user__last_name',
+    'to_user__id', 'to_user__email', 'to_user__first_name', 'to_user__last_name',
+)
+
 # Create your views here.
 
+class ContactCursorPagination(CursorPagination):
+    # Keyset pagination on the models' default ordering, so page cost
+    # doesn't grow with how far into the list the client is.
+    page_size = 25
+    ordering = '-created_at'
+
 class ContactViewSet(viewsets.ModelViewSet):
     serializer_class = ContactSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ContactCursorPagination
     http_method_names = ['get', 'post', 'delete', 'head', 'options']
 
     def get_queryset(self):
         # Return contacts where the current user is either the 'user' or the 'contact'
-        return Contact.objects.filter(
+        return Contact.objects.select_related('user', 'contact').only(*CONTACT_COLUMNS).filter(
             models.Q(user=self.request.user) |
             models.Q(contact=self.request.user)
         )
@@ -24,23 +51,37 @@ class ContactViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    @action(detail=True, methods=['delete'])
-    def remove(self, request, pk=None):
-        contact = self.get_object()
-        # Also remove the reverse contact relationship
-        Contact.objects.filter(
-            user=contact.contact,
-            contact=contact.user
+    def destroy(self, request, pk=None):
+        # Delete the contact together with its reverse relationship in a
+        # single DELETE, without loading either row first
+        try:
+            mine = Contact.objects.filter(
+                models.Q(user=request.user) | models.Q(contact=request.user),
+                pk=pk
+            ).order_by()
+        except (TypeError, ValueError):
+            raise NotFound()
+        deleted, _ = Contact.objects.filter(
+            models.Q(pk__in=mine.values('pk')) |
+            models.Q(
+                user=models.Subquery(mine.values('contact')[:1]),
+                contact=models.Subquery(mine.values('user')[:1])
+            )
         ).delete()
-        contact.delete()
+        if not deleted:
+            raise NotFound()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=True, methods=['delete'])
+    def remove(self, request, pk=None):
+        return self.destroy(request, pk=pk)
+
 @api_view(['POST'])
 def create_contact_request(request):
     """
     Create a new contact request using email instead of user ID.
     """
-    print(f"DEBUG: Processing POST request to create contact request with data: {request.data}")
+    logger.debug("Creating contact request from user %s", request.user.pk)
     
     # Check if email is provided
     to_email = request.data.get('email')
@@ -49,19 +90,32 @@ def create_contact_request(request):
             {"error": "Email is required"},
             status=status.HTTP_400_BAD_REQUEST
         )
+    if not isinstance(to_email, str):
+        return Response(
+            {"error": "Email must be a string"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Look up the user by email
+    # Look up the user by email, together with the contact and pending
+    # request checks, in a single query
     try:
-        to_user = CustomUser.objects.get(email=to_email)
+        to_user = CustomUser.objects.annotate(
+            has_contact=models.Exists(Contact.objects.filter(
+                user=request.user,
+                contact=models.OuterRef('pk')
+            )),
+            has_pending=models.Exists(ContactRequest.objects.filter(
+                models.Q(from_user=request.user, to_user=models.OuterRef('pk')) |
+                models.Q(from_user=models.OuterRef('pk'), to_user=request.user),
+                status='pending'
+            ))
+        ).get(email=to_email.lower())
     except CustomUser.DoesNotExist:
         return Response(
             {"error": f"User with email {to_email} not found"},
             status=status.HTTP_404_NOT_FOUND
         )
     
-    # Create the data for the serializer with the found user
-    data = {'to_user_id': to_user.id}
-    
     # Check if this is a request to yourself
     if to_user.id == request.user.id:
         return Response(
@@ -70,66 +124,58 @@ def create_contact_request(request):
         )
     
     # Check if a contact already exists
-    existing_contact = Contact.objects.filter(
-        user=request.user,
-        contact=to_user
-    ).exists()
-    
-    if existing_contact:
+    if to_user.has_contact:
         return Response(
             {"error": "This user is already in your contacts"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check if there's a pending request already
-    existing_request = ContactRequest.objects.filter(
-        from_user=request.user,
-        to_user=to_user,
-        status='pending'
-    ).exists()
-    
-    if existing_request:
+    # Check if there's a pending request already, in either direction
+    if to_user.has_pending:
         return Response(
             {"error": "A pending request already exists for this user"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Create the serializer with the user ID we found
-    serializer = ContactRequestSerializer(
-        data=data,
-        context={'request': request}
-    )
-    
-    if not serializer.is_valid():
-        print(f"DEBUG: Serializer errors: {serializer.errors}")
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+    # The checks above already cover what the serializer would validate;
+    # the only thing left to trip over is an earlier, already answered
+    # request for the same pair (unique_together)
     try:
-        serializer.save(from_user=request.user)
-        print(f"DEBUG: Successfully created contact request: {serializer.data}")
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    except Exception as e:
-        print(f"DEBUG: Exception during contact request creation: {str(e)}")
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        with transaction.atomic():
+            contact_request = ContactRequest.objects.create(
+                from_user=request.user,
+                to_user=to_user
+            )
+    except IntegrityError:
+        return Response(
+            {"error": "A contact request to this user already exists"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    logger.debug("Created contact request %s", contact_request.pk)
+    return Response(ContactRequestSerializer(contact_request).data, status=status.HTTP_201_CREATED)
 
 class ContactRequestList(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        contact_requests = ContactRequest.objects.filter(
+        contact_requests = ContactRequest.objects.select_related('from_user', 'to_user').only(*CONTACT_REQUEST_COLUMNS).filter(
             models.Q(from_user=request.user) |
             models.Q(to_user=request.user)
         )
-        serializer = ContactRequestSerializer(contact_requests, many=True)
-        return Response(serializer.data)
+        paginator = ContactCursorPagination()
+        page = paginator.paginate_queryset(contact_requests, request, view=self)
+        serializer = ContactRequestSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class ContactRequestViewSet(viewsets.ModelViewSet):
     serializer_class = ContactRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ContactCursorPagination
     http_method_names = ['get', 'put', 'patch', 'delete', 'head', 'options', 'post']
 
     def get_queryset(self):
-        return ContactRequest.objects.filter(
+        return ContactRequest.objects.select_related('from_user', 'to_user').only(*CONTACT_REQUEST_COLUMNS).filter(
             models.Q(from_user=self.request.user) |
             models.Q(to_user=self.request.user)
         )
@@ -161,116 +207,111 @@ class ContactRequestViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def received(self, request):
-        received_requests = ContactRequest.objects.filter(
+        received_requests = ContactRequest.objects.select_related('from_user', 'to_user').only(*CONTACT_REQUEST_COLUMNS).filter(
             to_user=request.user,
             status='pending'
         )
-        serializer = self.get_serializer(received_requests, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(received_requests)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def sent(self, request):
-        sent_requests = ContactRequest.objects.filter(
+        sent_requests = ContactRequest.objects.select_related('from_user', 'to_user').only(*CONTACT_REQUEST_COLUMNS).filter(
             from_user=request.user,
             status='pending'
         )
-        serializer = self.get_serializer(sent_requests, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(sent_requests)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 @api_view(['POST'])
 def accept_contact_request(request, pk):
     """
     Accept a contact request.
     """
-    print(f"DEBUG: Processing accept request for contact request {pk}")
-    try:
-        contact_request = ContactRequest.objects.get(pk=pk)
-    except ContactRequest.DoesNotExist:
+    logger.debug("Accepting contact request %s", pk)
+    with transaction.atomic():
+        # Permission and status checks are folded into the UPDATE itself, so
+        # concurrent accept/reject calls can't both get through
+        updated = ContactRequest.objects.filter(
+            pk=pk,
+            to_user=request.user,
+            status='pending'
+        ).update(status='accepted', updated_at=timezone.now())
+        
+        if updated:
+            from_user_id = ContactRequest.objects.filter(pk=pk).values_list('from_user_id', flat=True).get()
+            
+            # Create bidirectional contacts in one INSERT; pairs that already
+            # exist are skipped by the unique_together constraint
+            Contact.objects.bulk_create([
+                Contact(user_id=from_user_id, contact_id=request.user.id),
+                Contact(user_id=request.user.id, contact_id=from_user_id),
+            ], ignore_conflicts=True)
+            return Response({'status': 'contact request accepted'})
+    
+    # Nothing was updated; work out why
+    contact_request = ContactRequest.objects.filter(pk=pk).values('to_user_id', 'status').first()
+    if contact_request is None:
         return Response(
             {"error": f"Contact request with ID {pk} not found"},
             status=status.HTTP_404_NOT_FOUND
         )
     
     # Check permissions
-    if contact_request.to_user != request.user:
+    if contact_request['to_user_id'] != request.user.id:
         return Response(
             {'error': 'You can only accept requests sent to you'},
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Check if already accepted
-    if contact_request.status == 'accepted':
-        return Response({'status': 'contact request was already accepted'})
-    
     # Check if already rejected
-    if contact_request.status == 'rejected':
+    if contact_request['status'] == 'rejected':
         return Response(
             {'error': 'This contact request was already rejected'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    try:
-        # Update the status
-        contact_request.status = 'accepted'
-        contact_request.save(update_fields=['status', 'updated_at'])
-        
-        # Create bidirectional contacts - handle each direction individually
-        try:
-            # From user -> to user
-            if not Contact.objects.filter(user=contact_request.from_user, contact=contact_request.to_user).exists():
-                Contact.objects.create(user=contact_request.from_user, contact=contact_request.to_user)
-        except Exception as e:
-            print(f"DEBUG: Exception creating from_user->to_user contact: {str(e)}")
-            
-        try:
-            # To user -> from user
-            if not Contact.objects.filter(user=contact_request.to_user, contact=contact_request.from_user).exists():
-                Contact.objects.create(user=contact_request.to_user, contact=contact_request.from_user)
-        except Exception as e:
-            print(f"DEBUG: Exception creating to_user->from_user contact: {str(e)}")
-            
-        return Response({'status': 'contact request accepted'})
-    except Exception as e:
-        print(f"DEBUG: Exception during contact request acceptance: {str(e)}")
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({'status': 'contact request was already accepted'})
 
 @api_view(['POST'])
 def reject_contact_request(request, pk):
     """
     Reject a contact request.
     """
-    print(f"DEBUG: Processing reject request for contact request {pk}")
-    try:
-        contact_request = ContactRequest.objects.get(pk=pk)
-    except ContactRequest.DoesNotExist:
+    logger.debug("Rejecting contact request %s", pk)
+    # Permission and status checks are folded into the UPDATE itself, so a
+    # concurrent accept can't slip in between them
+    updated = ContactRequest.objects.filter(
+        pk=pk,
+        to_user=request.user,
+        status='pending'
+    ).update(status='rejected', updated_at=timezone.now())
+    
+    if updated:
+        return Response({'status': 'contact request rejected'})
+    
+    # Nothing was updated; work out why
+    contact_request = ContactRequest.objects.filter(pk=pk).values('to_user_id', 'status').first()
+    if contact_request is None:
         return Response(
             {"error": f"Contact request with ID {pk} not found"},
             status=status.HTTP_404_NOT_FOUND
         )
     
     # Check permissions
-    if contact_request.to_user != request.user:
+    if contact_request['to_user_id'] != request.user.id:
         return Response(
             {'error': 'You can only reject requests sent to you'},
             status=status.HTTP_403_FORBIDDEN
         )
     
     # Check if already accepted
-    if contact_request.status == 'accepted':
+    if contact_request['status'] == 'accepted':
         return Response(
             {'error': 'This contact request was already accepted and cannot be rejected'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check if already rejected
-    if contact_request.status == 'rejected':
-        return Response({'status': 'contact request was already rejected'})
-    
-    try:
-        # Update the status
-        contact_request.status = 'rejected'
-        contact_request.save(update_fields=['status', 'updated_at'])
-        return Response({'status': 'contact request rejected'})
-    except Exception as e:
-        print(f"DEBUG: Exception during contact request rejection: {str(e)}")
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({'status': 'contact request was already rejected'})
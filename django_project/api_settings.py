@@ -0,0 +1,50 @@
+"""
+Settings for processes that only serve the JSON API (/api/...).
+
+The API authenticates with Knox bearer tokens, so the session, message,
+allauth and admin machinery in the main settings is dead weight on every
+request there. Run the API workers with
+DJANGO_SETTINGS_MODULE=django_project.api_settings; the site pages, allauth
+and the admin stay on processes using the main settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in {
+        "django.contrib.admin",
+        "django.contrib.messages",
+        "django.contrib.sites",
+        "allauth",
+        "allauth.account",
+        "crispy_forms",
+        "crispy_bootstrap5",
+    }
+]
+
+# AuthenticationMiddleware needs the session; DRF sets request.user itself
+MIDDLEWARE = [
+    m for m in MIDDLEWARE
+    if not any(part in m for part in ("session", "message", "allauth", "clickjacking", "auth.middleware"))
+]
+
+ROOT_URLCONF = "django_project.api_urls"
+
+AUTHENTICATION_BACKENDS = ("django.contrib.auth.backends.ModelBackend",)
+
+# Only app templates (the DRF browsable API); the site templates link to
+# allauth and page URLs that aren't routed here
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+            ],
+        },
+    },
+]
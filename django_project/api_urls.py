@@ -0,0 +1,8 @@
+from django.urls import path, include
+
+# URLconf for django_project.api_settings: the API routes only
+urlpatterns = [
+    path('api/', include('accounts.urls')),
+    path("api/lessons/", include("lessons.urls")),
+    path("api/contacts/", include("contacts.urls")),
+]
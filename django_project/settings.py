@@ -1,23 +1,28 @@
 from pathlib import Path
-import os
+
+import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Environment variables are read (and cast) through django-environ; the values
+# come from the .env.* files docker-compose loads
+env = environ.Env(DEBUG=(bool, False))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/dev/howto/deployment/checklist/
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#secret-key
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.environ.get("SECRET_KEY")
+SECRET_KEY = env("SECRET_KEY")
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#debug
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = (os.getenv('DEBUG', 'False') == 'True')
+DEBUG = env("DEBUG")
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
-ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS").split(",")
+ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS")
 
 # Application definition
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
@@ -48,7 +53,7 @@ INSTALLED_APPS = [
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    # "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise
+    "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     # "debug_toolbar.middleware.DebugToolbarMiddleware",  # Django Debug Toolbar
@@ -93,15 +98,26 @@ TEMPLATES = [
 # For Docker/PostgreSQL usage uncomment this and comment the DATABASES config above
 DATABASES = {
     "default": {
-        "ENGINE": os.environ.get("DB_ENGINE"),
-        "NAME": os.environ.get("DB_NAME"),
-        "USER": os.environ.get("DB_USER"),
-        "PASSWORD": os.environ.get("DB_PASSWORD"),
-        "HOST": os.environ.get("DB_HOST"),  # set in docker-compose.yml
-        "PORT": os.environ.get("DB_PORT"),  # default postgres port
+        "ENGINE": env("DB_ENGINE"),
+        "NAME": env("DB_NAME"),
+        "USER": env("DB_USER", default=""),
+        "PASSWORD": env("DB_PASSWORD", default=""),
+        "HOST": env("DB_HOST", default=""),  # set in docker-compose.yml
+        "PORT": env("DB_PORT", default=""),  # default postgres port
     }
 }
 
+# Password hashing
+# https://docs.djangoproject.com/en/dev/topics/auth/passwords/#using-argon2-with-django
+# Argon2 is the cheaper hash at an equivalent security level; the PBKDF2
+# hashers stay listed so existing hashes still verify (and get upgraded on login)
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -158,14 +174,35 @@ STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
     },
-    # "staticfiles": {
-    #     "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
-    # },
+    # Hashed, pre-compressed files that WhiteNoise serves with far-future
+    # cache headers; requires collectstatic to have been run
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# https://docs.djangoproject.com/en/dev/topics/cache/#redis
+# Same Redis instance as the Celery broker, separate database
+REDIS_URL = env("REDIS_URL", default="redis://redis:6379/1")
+
+# Open practice session event streams allowed per process; each holds a
+# gunicorn thread while open. Production runs 2 workers x 8 threads
+# (Dockerfile.prod, docker-compose.prod.yml), so streams get at most half of
+# each worker's threads and the other half keeps serving the API.
+EVENT_STREAM_MAX_OPEN = env.int("EVENT_STREAM_MAX_OPEN", default=4)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+# https://docs.djangoproject.com/en/dev/topics/http/sessions/#using-cached-sessions
+# Session reads come from Redis; writes still go through to the database so a
+# cache flush doesn't log everyone out
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/stable/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -181,13 +218,37 @@ EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 # https://docs.djangoproject.com/en/dev/ref/settings/#default-from-email
 DEFAULT_FROM_EMAIL = "root@localhost"
 
+# https://docs.djangoproject.com/en/dev/topics/logging/
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "contacts": {
+            "handlers": ["console"],
+            "level": "DEBUG" if DEBUG else "WARNING",
+        },
+    },
+}
+
 # django-debug-toolbar
 # https://django-debug-toolbar.readthedocs.io/en/latest/installation.html
 # https://docs.djangoproject.com/en/dev/ref/settings/#internal-ips
-# INTERNAL_IPS = ["127.0.0.1"]
-import socket
-hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
-INTERNAL_IPS = [ip[:-1] + "1" for ip in ips]
+# Only the toolbar reads this, so the (potentially slow) hostname lookup for
+# the Docker gateway address is skipped unless DEBUG is on and no explicit
+# list was given
+INTERNAL_IPS = env.list("DJANGO_INTERNAL_IPS", default=["127.0.0.1"])
+if DEBUG and "DJANGO_INTERNAL_IPS" not in env:
+    import socket
+    try:
+        hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
+        INTERNAL_IPS += [ip[:-1] + "1" for ip in ips]
+    except OSError:
+        pass
 
 
 # https://docs.djangoproject.com/en/dev/topics/auth/customizing/#substituting-a-custom-user-model
@@ -231,9 +292,23 @@ REST_KNOX = {
 }
 
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://redis:6379/0'
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://redis:6379/0')
+CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://redis:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Audio comparisons run for tens of seconds; keep them on their own queue so
+# they can't hold up short tasks, and don't let a worker reserve more than
+# the one it's running
+CELERY_TASK_ROUTES = {
+    'lessons.tasks.process_practice_session_file': {'queue': 'audio'},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Run by the celery_beat service
+CELERY_BEAT_SCHEDULE = {
+    'reap-stuck-practice-sessions': {
+        'task': 'lessons.tasks.reap_stuck_practice_sessions',
+        'schedule': 600.0,
+    },
+}
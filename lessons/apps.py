@@ -1,6 +1,24 @@
-from django.apps import AppConfig
+import os
+import sys
+
+from django.apps import AppConfig, apps
 
 
 class LessonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lessons'
+
+    def ready(self):
+        # Celery workers never serve the admin, so don't build the admin
+        # classes there; every other process (runserver, gunicorn, tests,
+        # shell) registers as usual, unless the admin isn't installed at all
+        # (api_settings)
+        if os.path.basename(sys.argv[0]) == 'celery' or not apps.is_installed('django.contrib.admin'):
+            return
+
+        from django.contrib import admin
+        from .admin import LessonAssignmentRequestAdmin
+        from .models import Lesson, PracticeSession, LessonAssignment, LessonAssignmentRequest
+
+        admin.site.register(LessonAssignmentRequest, LessonAssignmentRequestAdmin)
+        admin.site.register([Lesson, PracticeSession, LessonAssignment])
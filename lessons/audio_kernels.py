@@ -0,0 +1,160 @@
+"""
+Numba kernels used by the audio comparison.
+
+Kept in their own module so importing ``lessons.audio_compare`` doesn't pull
+in numba; ``compare_audio`` imports this module when it runs.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def dtw_banded_cosine(X, Y, radius):
+    """
+    Dynamic Time Warping on cosine distance, restricted to a Sakoe-Chiba band.
+
+    The cost of a cell is ``1 - X[i] . Y[j]`` (clipped to [0, 2]), computed
+    when the cell is visited instead of from a precomputed (n, m) matrix, and
+    the accumulated cost and backtrack steps are only stored for the band, so
+    memory is O(n * radius) rather than O(n * m).
+
+    Uses the same recurrence and step preference as ``librosa.sequence.dtw``
+    with its default steps (diagonal, then horizontal, then vertical), but
+    only visits cells within ``radius`` frames of the diagonal running from
+    (0, 0) to (n-1, m-1).
+
+    Args:
+        X (numpy.ndarray): Unit-norm feature frames with shape (n, d)
+        Y (numpy.ndarray): Unit-norm feature frames with shape (m, d)
+        radius (int): Half-width of the band, in frames. It is widened to at
+            least the slope of the diagonal so the band stays connected.
+
+    Returns:
+        numpy.ndarray: The warping path as an int32 array of (i, j) pairs,
+            ordered from the end of both sequences back to the start.
+    """
+    n, d = X.shape
+    m = Y.shape[0]
+    radius = max(radius, (m + n - 1) // n, 1)
+    width = 2 * radius + 1
+
+    # Row i of the band covers columns offset[i] .. offset[i] + width - 1
+    offset = np.empty(n, np.int64)
+    for i in range(n):
+        center = (i * (m - 1) + (n - 1) // 2) // (n - 1) if n > 1 else 0
+        offset[i] = center - radius
+
+    D = np.full((n, width), np.inf)
+    steps = np.zeros((n, width), np.int8)
+
+    for i in range(n):
+        off = offset[i]
+        prev_off = offset[i - 1] if i > 0 else 0
+        for j in range(max(0, off), min(m, off + width)):
+            cost = 0.0
+            for k in range(d):
+                cost += X[i, k] * Y[j, k]
+            cost = min(max(1.0 - cost, 0.0), 2.0)
+
+            if i == 0 and j == 0:
+                D[0, 0 - off] = cost
+                continue
+            best = np.inf
+            step = 0
+            if i > 0 and j > 0 and 0 <= j - 1 - prev_off < width and D[i - 1, j - 1 - prev_off] < best:
+                best = D[i - 1, j - 1 - prev_off]
+                step = 0
+            if j > 0 and j - 1 - off >= 0 and D[i, j - 1 - off] < best:
+                best = D[i, j - 1 - off]
+                step = 1
+            if i > 0 and 0 <= j - prev_off < width and D[i - 1, j - prev_off] < best:
+                best = D[i - 1, j - prev_off]
+                step = 2
+            D[i, j - off] = cost + best
+            steps[i, j - off] = step
+
+    # Backtrack from the end of both sequences
+    wp = np.empty((n + m - 1, 2), np.int32)
+    i, j = n - 1, m - 1
+    k = 0
+    while True:
+        wp[k, 0] = i
+        wp[k, 1] = j
+        k += 1
+        if i == 0 and j == 0:
+            break
+        step = steps[i, j - offset[i]]
+        if step == 0:
+            i -= 1
+            j -= 1
+        elif step == 1:
+            j -= 1
+        else:
+            i -= 1
+
+    return wp[:k]
+
+
+@njit(cache=True)
+def aligned_diffs(f0_t, times_t, f0_s, times_s, wp, X, Y, hop_over_sr):
+    """
+    Pitch and chroma differences along a warping path, in a single pass.
+
+    For every (i, j) pair in the path, looks up the pitch nearest to frame
+    i's time in the teacher track and frame j's time in the student track
+    (preferring the earlier frame on ties), and the Euclidean distance between
+    chroma frames ``X[i]`` and ``Y[j]``. Pitch differences are only kept where
+    both recordings have a detected pitch.
+
+    Args:
+        f0_t (numpy.ndarray): Teacher pitch per frame (Hz, NaN if unvoiced)
+        times_t (numpy.ndarray): Sorted times (seconds) of the teacher pitch frames
+        f0_s (numpy.ndarray): Student pitch per frame (Hz, NaN if unvoiced)
+        times_s (numpy.ndarray): Sorted times (seconds) of the student pitch frames
+        wp (numpy.ndarray): Warping path as (i, j) pairs, shape (k, 2)
+        X (numpy.ndarray): Teacher chroma frames with shape (n, d)
+        Y (numpy.ndarray): Student chroma frames with shape (m, d)
+        hop_over_sr (float): Seconds per chroma frame
+
+    Returns:
+        tuple: ``(pitch_diffs, aligned_times, chroma_diffs)``; the student minus
+            teacher pitch in cents and the teacher time (seconds) of each
+            voiced pair, and the chroma distance of every pair in the path.
+    """
+    k = wp.shape[0]
+    d = X.shape[1]
+    pitch_diffs = np.empty(k)
+    aligned_times = np.empty(k)
+    chroma_diffs = np.empty(k, X.dtype)
+    n_valid = 0
+
+    for p in range(k):
+        i = wp[p, 0]
+        j = wp[p, 1]
+
+        t = i * hop_over_sr
+        idx = min(max(np.searchsorted(times_t, t), 1), len(times_t) - 1)
+        if t - times_t[idx - 1] <= times_t[idx] - t:
+            idx -= 1
+        pitch_t = f0_t[idx]
+
+        u = j * hop_over_sr
+        idx = min(max(np.searchsorted(times_s, u), 1), len(times_s) - 1)
+        if u - times_s[idx - 1] <= times_s[idx] - u:
+            idx -= 1
+        pitch_s = f0_s[idx]
+
+        # Cents relative to A4 cancel out of the difference, leaving
+        # 1200 * log2(pitch_s / pitch_t)
+        if not (np.isnan(pitch_t) or np.isnan(pitch_s)):
+            pitch_diffs[n_valid] = 1200.0 * np.log2(pitch_s / pitch_t)
+            aligned_times[n_valid] = t
+            n_valid += 1
+
+        dist = 0.0
+        for c in range(d):
+            diff = X[i, c] - Y[j, c]
+            dist += diff * diff
+        chroma_diffs[p] = np.sqrt(dist)
+
+    return pitch_diffs[:n_valid], aligned_times[:n_valid], chroma_diffs
@@ -0,0 +1,141 @@
+"""
+Practice session processing events, published over Redis pub/sub.
+
+The processing task publishes every status change of a practice session on
+its own channel, and the practice session ``events`` endpoint relays them to
+the client as Server-Sent Events, so clients don't have to poll
+``processing_status``.
+"""
+import json
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .models import PracticeSession
+
+logger = logging.getLogger(__name__)
+
+ProcessingStatus = PracticeSession.ProcessingStatus
+
+# processing_status -> the event's state
+STATES = {
+    ProcessingStatus.PENDING: 'submitted',
+    ProcessingStatus.PROCESSING: 'working',
+    ProcessingStatus.COMPLETED: 'completed',
+    ProcessingStatus.FAILED: 'failed',
+}
+FINAL_STATUSES = {ProcessingStatus.COMPLETED, ProcessingStatus.FAILED}
+
+# Each open stream holds one of the process's gunicorn threads; past
+# EVENT_STREAM_MAX_OPEN streams, clients are told to reconnect later (in ms)
+_open_streams = threading.BoundedSemaphore(settings.EVENT_STREAM_MAX_OPEN)
+RECONNECT_DELAY = 10000
+
+
+def get_client():
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def channel_name(practice_session_id):
+    return f"practice_session:{practice_session_id}"
+
+
+def status_event(practice_session_id, processing_status):
+    """
+    Build the event for a practice session's processing status.
+    """
+    return {
+        'id': practice_session_id,
+        'status': {'state': STATES[processing_status]},
+        'final': processing_status in FINAL_STATUSES,
+    }
+
+
+def publish_status(practice_session_id, processing_status):
+    """
+    Publish a practice session's new processing status to its listeners.
+
+    Best effort: the status is already saved in the database, so a Redis
+    outage only costs the live update, never the task.
+    """
+    try:
+        get_client().publish(
+            channel_name(practice_session_id),
+            json.dumps(status_event(practice_session_id, processing_status))
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish status for practice session {practice_session_id}: {e}")
+
+
+def format_event(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def stream_status(practice_session_id, get_status, timeout=330, keepalive=15):
+    """
+    Yield Server-Sent Event frames for a practice session until it finishes.
+
+    Subscribes first and only then reads the current status (through
+    ``get_status``), so a change made between the two is never missed. Ends
+    after the final event, or after ``timeout`` seconds (longer than the
+    task's time limit); sends a comment every ``keepalive`` seconds so
+    proxies keep the connection open.
+
+    When the process already has EVENT_STREAM_MAX_OPEN streams open, only
+    the current status is sent, with a ``retry`` that has the client's
+    EventSource reconnect after RECONNECT_DELAY ms, so long-lived streams
+    can't take every thread from the rest of the API.
+    """
+    if not _open_streams.acquire(blocking=False):
+        yield f"retry: {RECONNECT_DELAY}\n" + format_event(status_event(practice_session_id, get_status()))
+        return
+    try:
+        yield from _relay_status(practice_session_id, get_status, timeout, keepalive)
+    finally:
+        _open_streams.release()
+
+
+def _relay_status(practice_session_id, get_status, timeout, keepalive):
+    pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+    try:
+        try:
+            pubsub.subscribe(channel_name(practice_session_id))
+        except redis.RedisError as e:
+            # No live updates; still tell the client where things stand
+            logger.warning(f"Could not subscribe to practice session {practice_session_id}: {e}")
+            yield format_event(status_event(practice_session_id, get_status()))
+            return
+
+        event = status_event(practice_session_id, get_status())
+        yield format_event(event)
+
+        deadline = time.monotonic() + timeout
+        while not event['final'] and time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=keepalive)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            event = json.loads(message['data'])
+            yield format_event(event)
+    finally:
+        pubsub.close()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF accept ``Accept: text/event-stream`` on the events endpoint; the
+    stream itself is a StreamingHttpResponse, so this only renders errors
+    (e.g. a 404 before streaming starts) as a single event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_event(data).encode(self.charset)
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-15 02:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0006_lessonassignmentrequest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonassignment',
+            index=models.Index(fields=['lesson', 'assigned_by'], name='lessons_les_lesson__ee9f8a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonassignmentrequest',
+            index=models.Index(fields=['requested_to', 'status', '-created_at'], name='lessons_les_request_8226cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonassignmentrequest',
+            index=models.Index(fields=['requested_by', '-created_at'], name='lessons_les_request_c571c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicesession',
+            index=models.Index(fields=['lesson', 'user', '-created_at'], name='lessons_pra_lesson__9911e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicesession',
+            index=models.Index(fields=['user', '-created_at'], name='lessons_pra_user_id_17ba89_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-15 02:24
+
+from django.db import migrations
+
+PROCESSING_STATUS_CODES = {'pending': 0, 'processing': 1, 'completed': 2, 'failed': 3}
+REQUEST_STATUS_CODES = {'pending': 0, 'accepted': 1, 'rejected': 2}
+
+
+def convert(model, field, codes):
+    # The columns are still character columns here; 0009 changes their type,
+    # so store the codes as strings the cast can read.
+    for name, code in codes.items():
+        model.objects.filter(**{field: name}).update(**{field: str(code)})
+
+
+def statuses_to_codes(apps, schema_editor):
+    convert(apps.get_model('lessons', 'PracticeSession'), 'processing_status', PROCESSING_STATUS_CODES)
+    convert(apps.get_model('lessons', 'LessonAssignmentRequest'), 'status', REQUEST_STATUS_CODES)
+
+
+def codes_to_statuses(apps, schema_editor):
+    convert(apps.get_model('lessons', 'PracticeSession'), 'processing_status',
+            {str(code): name for name, code in PROCESSING_STATUS_CODES.items()})
+    convert(apps.get_model('lessons', 'LessonAssignmentRequest'), 'status',
+            {str(code): name for name, code in REQUEST_STATUS_CODES.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_lessonassignment_lessons_les_lesson__ee9f8a_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(statuses_to_codes, codes_to_statuses),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-15 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_status_codes_to_integers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lessonassignmentrequest',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='practicesession',
+            name='processing_status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Processing'), (2, 'Completed'), (3, 'Failed')], default=0),
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+AUDIO_EXTENSIONS = ['mp3', 'wav', 'ogg', 'm4a']
+
+# One validator shared by every audio field
+validate_audio_extension = FileExtensionValidator(allowed_extensions=AUDIO_EXTENSIONS)
 
 class Lesson(models.Model):
     CATEGORY_CHOICES = [
@@ -21,6 +27,10 @@ class Lesson(models.Model):
         ('monthly', 'Monthly'),
     ]
 
+    # Built once here rather than on every get_*_display() call
+    CATEGORY_LABELS = dict(CATEGORY_CHOICES)
+    FREQUENCY_LABELS = dict(FREQUENCY_CHOICES)
+
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     instructions = models.TextField()
@@ -28,7 +38,7 @@ class Lesson(models.Model):
     image = models.ImageField(upload_to='lesson_images/', blank=True, null=True)
     audio = models.FileField(
         upload_to='lesson_audio/',
-        validators=[FileExtensionValidator(allowed_extensions=['mp3', 'wav', 'ogg', 'm4a'])],
+        validators=[validate_audio_extension],
         blank=True,
         null=True
     )
@@ -41,7 +51,7 @@ class Lesson(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.name} ({self.get_category_display()})"
+        return f"{self.name} ({self.CATEGORY_LABELS.get(self.category, self.category)})"
 
 class PracticeSession(models.Model):
     DIFFICULTY_CHOICES = [
@@ -52,12 +62,15 @@ class PracticeSession(models.Model):
         (5, 'Very Difficult'),
     ]
 
-    PROCESSING_STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('processing', 'Processing'),
-        ('completed', 'Completed'),
-        ('failed', 'Failed'),
-    ]
+    # Stored as a small integer; the API exposes the lowercase member names
+    # ('pending', 'processing', ...)
+    class ProcessingStatus(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        PROCESSING = 1, 'Processing'
+        COMPLETED = 2, 'Completed'
+        FAILED = 3, 'Failed'
+
+    DIFFICULTY_LABELS = dict(DIFFICULTY_CHOICES)
 
     lesson = models.ForeignKey(
         Lesson,
@@ -71,7 +84,7 @@ class PracticeSession(models.Model):
     )
     audio = models.FileField(
         upload_to='practice_audio/',
-        validators=[FileExtensionValidator(allowed_extensions=['mp3', 'wav', 'ogg', 'm4a'])],
+        validators=[validate_audio_extension],
         blank=True,
         null=True
     )
@@ -80,10 +93,9 @@ class PracticeSession(models.Model):
         help_text='Rating from 1 (Very Easy) to 5 (Very Difficult)'
     )
     notes = models.TextField(blank=True)
-    processing_status = models.CharField(
-        max_length=20,
-        choices=PROCESSING_STATUS_CHOICES,
-        default='pending'
+    processing_status = models.PositiveSmallIntegerField(
+        choices=ProcessingStatus.choices,
+        default=ProcessingStatus.PENDING
     )
     processing_results = models.JSONField(
         blank=True,
@@ -95,9 +107,20 @@ class PracticeSession(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's sessions for a lesson, and all of a user's sessions,
+            # newest first
+            models.Index(fields=['lesson', 'user', '-created_at']),
+            models.Index(fields=['user', '-created_at']),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.lesson.name} ({self.get_difficulty_display()})"
+        difficulty = self.DIFFICULTY_LABELS.get(self.difficulty, self.difficulty)
+        # Don't fetch the user and lesson just to print a row; callers that
+        # want the long form select_related('user', 'lesson')
+        if not (self._meta.get_field('user').is_cached(self) and self._meta.get_field('lesson').is_cached(self)):
+            return f"Practice session #{self.pk} ({difficulty})"
+        return f"{self.user.email} - {self.lesson.name} ({difficulty})"
 
 class LessonAssignment(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='assignments')
@@ -117,16 +140,20 @@ class LessonAssignment(models.Model):
 
     class Meta:
         unique_together = ['lesson', 'assigned_to']
+        indexes = [
+            models.Index(fields=['lesson', 'assigned_by']),
+        ]
 
     def __str__(self):
-        return f"{self.lesson.name} assigned to {self.assigned_to.username}"
+        return f"{self.lesson.name} assigned to {self.assigned_to.email}"
 
 class LessonAssignmentRequest(models.Model):
-    STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('accepted', 'Accepted'),
-        ('rejected', 'Rejected'),
-    ]
+    # Stored as a small integer; the API exposes the lowercase member names
+    # ('pending', 'accepted', 'rejected')
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        ACCEPTED = 1, 'Accepted'
+        REJECTED = 2, 'Rejected'
 
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='assignment_requests')
     requested_by = models.ForeignKey(
@@ -139,10 +166,9 @@ class LessonAssignmentRequest(models.Model):
         on_delete=models.CASCADE,
         related_name='received_lesson_requests'
     )
-    status = models.CharField(
-        max_length=10,
-        choices=STATUS_CHOICES,
-        default='pending'
+    status = models.PositiveSmallIntegerField(
+        choices=Status.choices,
+        default=Status.PENDING
     )
     due_date = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
@@ -152,40 +178,100 @@ class LessonAssignmentRequest(models.Model):
     class Meta:
         unique_together = ['lesson', 'requested_to']
         ordering = ['-created_at']
+        indexes = [
+            # The received (pending) and sent lists, newest first
+            models.Index(fields=['requested_to', 'status', '-created_at']),
+            models.Index(fields=['requested_by', '-created_at']),
+        ]
 
     def clean(self):
-        if self.requested_by == self.requested_to:
+        if self.requested_by_id == self.requested_to_id:
             raise ValidationError("A user cannot request a lesson assignment to themselves.")
-        if LessonAssignment.objects.filter(lesson=self.lesson, assigned_to=self.requested_to).exists():
+        # Both conflict checks in a single round trip
+        conflicts = LessonAssignment.objects.filter(
+            lesson_id=self.lesson_id,
+            assigned_to_id=self.requested_to_id
+        ).values_list(models.Value('assigned', output_field=models.CharField()), flat=True)
+        if self.status == self.Status.PENDING:
+            conflicts = conflicts.union(
+                LessonAssignmentRequest.objects.filter(
+                    lesson_id=self.lesson_id,
+                    requested_to_id=self.requested_to_id,
+                    status=self.Status.PENDING
+                ).exclude(pk=self.pk).order_by().values_list(models.Value('pending', output_field=models.CharField()), flat=True)
+            )
+        conflicts = set(conflicts)
+        if 'assigned' in conflicts:
             raise ValidationError("This lesson is already assigned to the user.")
-        if self.status == 'pending' and LessonAssignmentRequest.objects.filter(
-            lesson=self.lesson,
-            requested_to=self.requested_to,
-            status='pending'
-        ).exists():
+        if 'pending' in conflicts:
             raise ValidationError("A pending request for this lesson already exists for this user.")
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    # Fields a status transition writes; nothing clean() validates changes
+    STATUS_UPDATE_FIELDS = ['status', 'updated_at']
+
+    def save(self, *args, validate=True, **kwargs):
+        # Status-only transitions (accept/reject) skip the validation queries,
+        # as do callers that have just made the same checks (validate=False)
+        update_fields = kwargs.get('update_fields')
+        if validate and (update_fields is None or not set(update_fields) <= set(self.STATUS_UPDATE_FIELDS)):
+            self.full_clean()
         super().save(*args, **kwargs)
 
     def accept(self):
-        if self.status == 'pending':
-            self.status = 'accepted'
-            self.save()
-            # Create the lesson assignment
-            LessonAssignment.objects.create(
-                lesson=self.lesson,
-                assigned_by=self.requested_by,
-                assigned_to=self.requested_to,
-                due_date=self.due_date,
-                notes=self.notes
-            )
+        if self.status == self.Status.PENDING:
+            with transaction.atomic():
+                self.status = self.Status.ACCEPTED
+                self.save(update_fields=self.STATUS_UPDATE_FIELDS)
+                # Create the lesson assignment; unique_together turns an
+                # already existing assignment into a no-op.
+                LessonAssignment.objects.bulk_create([
+                    LessonAssignment(
+                        lesson_id=self.lesson_id,
+                        assigned_by_id=self.requested_by_id,
+                        assigned_to_id=self.requested_to_id,
+                        due_date=self.due_date,
+                        notes=self.notes
+                    )
+                ], ignore_conflicts=True)
 
     def reject(self):
-        if self.status == 'pending':
-            self.status = 'rejected'
-            self.save()
+        if self.status == self.Status.PENDING:
+            self.status = self.Status.REJECTED
+            self.save(update_fields=self.STATUS_UPDATE_FIELDS)
+
+    @classmethod
+    def bulk_accept(cls, queryset):
+        """
+        Accept every pending request in queryset with one UPDATE and one
+        INSERT, instead of a validated save() and create() per request.
+
+        The row locks keep a concurrent accept/reject from changing the
+        requests in between, and unique_together turns lessons that are
+        already assigned into no-ops. Returns the number of requests accepted.
+        """
+        with transaction.atomic():
+            requests = list(
+                queryset.filter(status=cls.Status.PENDING).select_for_update().order_by().only(
+                    'id', 'lesson_id', 'requested_by_id', 'requested_to_id', 'due_date', 'notes'
+                )
+            )
+            if not requests:
+                return 0
+            cls.objects.filter(pk__in=[r.pk for r in requests]).update(
+                status=cls.Status.ACCEPTED,
+                updated_at=timezone.now()
+            )
+            LessonAssignment.objects.bulk_create([
+                LessonAssignment(
+                    lesson_id=r.lesson_id,
+                    assigned_by_id=r.requested_by_id,
+                    assigned_to_id=r.requested_to_id,
+                    due_date=r.due_date,
+                    notes=r.notes
+                )
+                for r in requests
+            ], ignore_conflicts=True)
+        return len(requests)
 
     def __str__(self):
-        return f"{self.lesson.name} request from {self.requested_by.email} to {self.requested_to.email} ({self.status})"
+        return f"{self.lesson.name} request from {self.requested_by.email} to {self.requested_to.email} ({self.Status(self.status).name.lower()})"
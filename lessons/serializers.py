@@ -1,11 +1,35 @@
+from django.db.models import Exists, F, OuterRef, Prefetch
 from rest_framework import serializers
 from .models import Lesson, LessonAssignment, PracticeSession, LessonAssignmentRequest
 from accounts.serializers import UserProfileSerializer
 from accounts.models import CustomUser
 
+class ChoiceCodeField(serializers.ChoiceField):
+    """
+    An IntegerChoices field exposed by the lowercase names of its members
+    ('pending', 'completed', ...) rather than the stored integers.
+    """
+    def __init__(self, choices_class, **kwargs):
+        self.choices_class = choices_class
+        super().__init__(choices=[member.name.lower() for member in choices_class], **kwargs)
+
+    def to_representation(self, value):
+        return self.choices_class(value).name.lower()
+
+    def to_internal_value(self, data):
+        return self.choices_class[super().to_internal_value(data).upper()]
+
+# What a list of practice sessions serializes: everything but
+# processing_results, and only the profile columns of the user
+PRACTICE_SESSION_LIST_COLUMNS = (
+    'id', 'lesson', 'audio', 'difficulty', 'notes', 'created_at', 'updated_at', 'processing_status',
+    'user__id', 'user__email', 'user__first_name', 'user__last_name', 'user__date_joined',
+)
+
 class PracticeSessionSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
-    lesson_name = serializers.CharField(source='lesson.name', read_only=True)
+    processing_status = ChoiceCodeField(PracticeSession.ProcessingStatus, read_only=True)
+    lesson_name = serializers.SerializerMethodField()
 
     class Meta:
         model = PracticeSession
@@ -15,6 +39,30 @@ class PracticeSessionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'updated_at', 'lesson', 'processing_status', 'processing_results']
 
+    @staticmethod
+    def setup_list_loading(queryset):
+        """
+        Load what a list of practice sessions serializes in one query: the
+        user's profile joined in and the lesson's name annotated, rather
+        than a whole Lesson per row.
+        """
+        return queryset.select_related('user').only(*PRACTICE_SESSION_LIST_COLUMNS).annotate(
+            _lesson_name=F('lesson__name')
+        )
+
+    def get_lesson_name(self, obj):
+        if hasattr(obj, '_lesson_name'):
+            return obj._lesson_name
+        return obj.lesson.name
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # The analysis results are a detail field: lists of sessions leave
+        # them out (and their querysets don't load the column)
+        if isinstance(self.parent, serializers.ListSerializer):
+            fields.pop('processing_results')
+        return fields
+
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
@@ -36,6 +84,19 @@ class LessonAssignmentSerializer(serializers.ModelSerializer):
         validated_data['assigned_by'] = self.context['request'].user
         return super().create(validated_data)
 
+class LessonSummarySerializer(serializers.ModelSerializer):
+    """
+    A lesson's own fields, without the per-viewer assignments and practice
+    sessions, for nesting in other objects.
+    """
+    class Meta:
+        model = Lesson
+        fields = [
+            'id', 'name', 'category', 'instructions', 'frequency',
+            'image', 'audio', 'created_by', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
 class LessonAssignmentRequestSerializer(serializers.ModelSerializer):
     requested_to = UserProfileSerializer(read_only=True)
     requested_to_id = serializers.PrimaryKeyRelatedField(
@@ -44,7 +105,8 @@ class LessonAssignmentRequestSerializer(serializers.ModelSerializer):
         source='requested_to'
     )
     requested_by = UserProfileSerializer(read_only=True)
-    lesson_details = serializers.SerializerMethodField()
+    status = ChoiceCodeField(LessonAssignmentRequest.Status, read_only=True)
+    lesson_details = LessonSummarySerializer(source='lesson', read_only=True)
     lesson_id = serializers.PrimaryKeyRelatedField(
         queryset=Lesson.objects.all(),
         write_only=True,
@@ -60,9 +122,13 @@ class LessonAssignmentRequestSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['requested_by', 'created_at', 'updated_at', 'status']
 
-    def get_lesson_details(self, obj):
-        from .serializers import LessonSerializer
-        return LessonSerializer(obj.lesson, context=self.context).data
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Select the lesson and both users the nested fields read, so a list of
+        requests is a single query.
+        """
+        return queryset.select_related('lesson', 'requested_by', 'requested_to')
 
     def create(self, validated_data):
         validated_data['requested_by'] = self.context['request'].user
@@ -70,7 +136,6 @@ class LessonAssignmentRequestSerializer(serializers.ModelSerializer):
 
 class LessonSerializer(serializers.ModelSerializer):
     assignments = serializers.SerializerMethodField()
-    practice_sessions = PracticeSessionSerializer(many=True, read_only=True)
     is_assigned_to_me = serializers.SerializerMethodField()
     my_practice_sessions = serializers.SerializerMethodField()
 
@@ -79,29 +144,58 @@ class LessonSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'category', 'instructions', 'frequency',
             'image', 'audio', 'created_by', 'created_at', 'updated_at',
-            'assignments', 'practice_sessions', 'is_assigned_to_me',
-            'my_practice_sessions'
+            'assignments', 'is_assigned_to_me', 'my_practice_sessions'
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset, user):
+        """
+        Prefetch everything the nested fields read, so serializing a list of
+        lessons costs a fixed number of queries instead of a few per lesson.
+        """
+        return queryset.annotate(
+            _is_assigned_to_me=Exists(
+                LessonAssignment.objects.filter(lesson=OuterRef('pk'), assigned_to=user)
+            )
+        ).prefetch_related(
+            Prefetch(
+                'assignments',
+                queryset=LessonAssignment.objects.filter(assigned_by=user).select_related('assigned_to'),
+                to_attr='assignments_by_me'
+            ),
+            Prefetch(
+                'practice_sessions',
+                queryset=PracticeSession.objects.filter(user=user).select_related('user').only(*PRACTICE_SESSION_LIST_COLUMNS),
+                to_attr='my_practice_sessions_list'
+            ),
+        )
+
     def get_is_assigned_to_me(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, '_is_assigned_to_me'):
+                return obj._is_assigned_to_me
             return obj.assignments.filter(assigned_to=request.user).exists()
         return False
 
     def get_assignments(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            assignments = obj.assignments.filter(assigned_by=request.user)
+            assignments = getattr(obj, 'assignments_by_me', None)
+            if assignments is None:
+                assignments = obj.assignments.filter(assigned_by=request.user)
             return LessonAssignmentSerializer(assignments, many=True).data
         return []
 
     def get_my_practice_sessions(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            practice_sessions = getattr(obj, 'my_practice_sessions_list', None)
+            if practice_sessions is None:
+                practice_sessions = obj.practice_sessions.filter(user=request.user)
             return PracticeSessionSerializer(
-                obj.practice_sessions.filter(user=request.user),
+                practice_sessions,
                 many=True,
                 context=self.context
             ).data
@@ -109,4 +203,15 @@ class LessonSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data) 
\ No newline at end of file
+        return super().create(validated_data)
+
+class LessonListSerializer(LessonSerializer):
+    """
+    LessonSerializer for lists whose queryset went through
+    setup_eager_loading: the nested fields are plain serializer fields over
+    the prefetched data, bound once for the whole list instead of a new
+    serializer per lesson. Renders the same fields.
+    """
+    assignments = LessonAssignmentSerializer(source='assignments_by_me', many=True, read_only=True)
+    is_assigned_to_me = serializers.BooleanField(source='_is_assigned_to_me', read_only=True)
+    my_practice_sessions = PracticeSessionSerializer(source='my_practice_sessions_list', many=True, read_only=True)
@@ -1,61 +1,140 @@
-from celery import shared_task
+from celery import Task, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.utils import timezone
+import json
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
 import numpy as np
 import logging
 from .models import PracticeSession
+from .events import publish_status
 from .audio_compare import compare_audio
 
 logger = logging.getLogger(__name__)
 
-def convert_numpy_to_python(obj):
+ProcessingStatus = PracticeSession.ProcessingStatus
+
+def numpy_default(obj):
     """
-    Convert numpy types to Python native types for JSON serialization.
+    ``json.dumps`` hook for the numpy scalars and arrays in the comparison results.
     """
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
         return obj.tolist()
-    elif isinstance(obj, dict):
-        return {key: convert_numpy_to_python(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_to_python(item) for item in obj]
-    return obj
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
-@shared_task
-def process_practice_session_file(practice_audio_path, lesson_audio_path):
+@contextmanager
+def local_path(name):
+    """
+    Yield a local filesystem path for a file in default_storage.
+
+    Local storage hands back its own path; storages without one (S3 and the
+    like) are copied to a temporary file that is removed afterwards.
+    """
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+    with default_storage.open(name, 'rb') as src, \
+            tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1]) as tmp:
+        shutil.copyfileobj(src, tmp)
+        tmp.flush()
+        yield tmp.name
+
+# Sessions left in 'processing' for longer than this are marked failed by
+# reap_stuck_practice_sessions; well past the task's hard time limit
+STUCK_PROCESSING_TIMEOUT = timedelta(minutes=30)
+
+def mark_failed(practice_session_id):
+    """
+    Mark a practice session that is still being processed as failed.
+    """
+    updated = PracticeSession.objects.filter(
+        pk=practice_session_id,
+        processing_status=ProcessingStatus.PROCESSING
+    ).update(processing_status=ProcessingStatus.FAILED, updated_at=timezone.now())
+    if updated:
+        publish_status(practice_session_id, ProcessingStatus.FAILED)
+
+class PracticeSessionTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # The task body handles its own errors, the soft time limit included;
+        # this only sees what escapes it (e.g. an error raised while handling
+        # another). The hard time limit and killed workers never get here:
+        # Celery fails those from the parent process, and
+        # reap_stuck_practice_sessions picks up their sessions.
+        practice_session_id = kwargs.get('practice_session_id', args[0] if args else None)
+        logger.error(f"Processing task {task_id} failed for practice session {practice_session_id}: {exc}")
+        if practice_session_id is not None:
+            mark_failed(practice_session_id)
+
+# Acknowledged only once it finishes, so a message whose worker dies (OOM,
+# restart) goes back on the queue instead of being lost. It is only run again
+# if it never got going: see the redelivery check in the task.
+@shared_task(
+    bind=True,
+    base=PracticeSessionTask,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    soft_time_limit=270,
+    time_limit=300
+)
+def process_practice_session_file(self, practice_session_id, lesson_audio_path):
     """
     Process the uploaded audio file for a practice session and compare it with the lesson's audio.
     This function:
-    1. Gets the absolute paths of both audio files
+    1. Gets local paths for both audio files
     2. Uses the compare_audio function to analyze the performance
     3. Updates the practice session with processing results
     """
     try:
-        # Get the practice session associated with this file
-        practice_session = PracticeSession.objects.get(audio=practice_audio_path)
-        logger.info(f"Processing practice session {practice_session.id}")
+        # Get the practice session by primary key
+        practice_session = PracticeSession.objects.get(pk=practice_session_id)
+        
+        # A redelivered message for a session still marked processing means
+        # an earlier run died mid-comparison (reject_on_worker_lost requeues
+        # it). Whatever killed that worker (OOM, a crash in ffmpeg or numba)
+        # would most likely kill the next one too, so fail the session rather
+        # than requeue it forever. Messages that were only prefetched when
+        # their worker went away never got that far and run normally.
+        redelivered = (self.request.delivery_info or {}).get('redelivered')
+        if redelivered and practice_session.processing_status == ProcessingStatus.PROCESSING:
+            logger.error(f"Practice session {practice_session_id} was being processed by a worker that died, marking it failed")
+            mark_failed(practice_session_id)
+            return {
+                'status': 'error',
+                'message': f'Processing was interrupted for practice session {practice_session_id}'
+            }
         
-        # Update processing status
-        practice_session.processing_status = 'processing'
-        practice_session.save()
+        practice_audio_path = practice_session.audio.name
+        logger.info(f"Processing practice session {practice_session.id}")
         
-        # Get absolute paths for both files
-        practice_audio_abs = os.path.join(default_storage.location, practice_audio_path)
-        lesson_audio_abs = os.path.join(default_storage.location, lesson_audio_path) if lesson_audio_path else None
+        # Update processing status; only the columns that change are written
+        PracticeSession.objects.filter(pk=practice_session.pk).update(
+            processing_status=ProcessingStatus.PROCESSING,
+            updated_at=timezone.now()
+        )
+        publish_status(practice_session.pk, ProcessingStatus.PROCESSING)
         
-        if not lesson_audio_abs or not os.path.exists(lesson_audio_abs):
+        if not lesson_audio_path or not default_storage.exists(lesson_audio_path):
             raise FileNotFoundError("Lesson audio file not found")
             
         # Use the compare_audio function to analyze the performance
-        results = compare_audio(lesson_audio_abs, practice_audio_abs)
+        with local_path(lesson_audio_path) as lesson_audio_abs, local_path(practice_audio_path) as practice_audio_abs:
+            results = compare_audio(lesson_audio_abs, practice_audio_abs)
         logger.info(f"Audio comparison completed with results: {results}")
         
-        # Convert numpy types to Python native types
-        results = convert_numpy_to_python(results)
+        # Convert numpy types to Python native types in one pass of the C encoder
+        results = json.loads(json.dumps(results, default=numpy_default))
         
         # Prepare the processing results
         processing_results = {
@@ -70,13 +149,12 @@ def process_practice_session_file(practice_audio_path, lesson_audio_path):
         logger.info(f"Updating practice session with results: {processing_results}")
         
         # Update the practice session with processing results
-        practice_session.processing_status = 'completed'
-        practice_session.processing_results = processing_results
-        practice_session.save()
-        
-        # Verify the save
-        practice_session.refresh_from_db()
-        logger.info(f"Practice session updated. Current results: {practice_session.processing_results}")
+        PracticeSession.objects.filter(pk=practice_session.pk).update(
+            processing_status=ProcessingStatus.COMPLETED,
+            processing_results=processing_results,
+            updated_at=timezone.now()
+        )
+        publish_status(practice_session.pk, ProcessingStatus.COMPLETED)
         
         return {
             'status': 'success',
@@ -85,17 +163,29 @@ def process_practice_session_file(practice_audio_path, lesson_audio_path):
             'lesson_audio': lesson_audio_path,
             'results': results
         }
+    except SoftTimeLimitExceeded:
+        # Raised in the task at soft_time_limit, leaving it time to record
+        # the failure before the hard limit kills the process
+        logger.error(f"Processing practice session {practice_session_id} timed out")
+        mark_failed(practice_session_id)
+        return {
+            'status': 'error',
+            'message': f'Processing timed out for practice session {practice_session_id}'
+        }
     except PracticeSession.DoesNotExist:
-        logger.error(f"Practice session not found for file: {practice_audio_path}")
+        logger.error(f"Practice session not found: {practice_session_id}")
         return {
             'status': 'error',
-            'message': f'Practice session not found for file: {practice_audio_path}'
+            'message': f'Practice session not found: {practice_session_id}'
         }
     except FileNotFoundError as e:
         logger.error(f"File not found: {str(e)}")
         if 'practice_session' in locals():
-            practice_session.processing_status = 'failed'
-            practice_session.save()
+            PracticeSession.objects.filter(pk=practice_session.pk).update(
+                processing_status=ProcessingStatus.FAILED,
+                updated_at=timezone.now()
+            )
+            publish_status(practice_session.pk, ProcessingStatus.FAILED)
         return {
             'status': 'error',
             'message': str(e)
@@ -104,10 +194,32 @@ def process_practice_session_file(practice_audio_path, lesson_audio_path):
         logger.error(f"Error processing files: {str(e)}")
         # Update practice session status to failed
         if 'practice_session' in locals():
-            practice_session.processing_status = 'failed'
-            practice_session.save()
+            PracticeSession.objects.filter(pk=practice_session.pk).update(
+                processing_status=ProcessingStatus.FAILED,
+                updated_at=timezone.now()
+            )
+            publish_status(practice_session.pk, ProcessingStatus.FAILED)
             
         return {
             'status': 'error',
             'message': f'Error processing files: {str(e)}'
-        } 
\ No newline at end of file
+        } 
+
+@shared_task
+def reap_stuck_practice_sessions():
+    """
+    Mark practice sessions stuck in 'processing' as failed.
+
+    Covers what the task can't record itself: the hard time limit, and a
+    worker killed outright whose message isn't redelivered; runs
+    periodically from celery beat (CELERY_BEAT_SCHEDULE).
+    """
+    cutoff = timezone.now() - STUCK_PROCESSING_TIMEOUT
+    stuck_ids = list(PracticeSession.objects.filter(
+        processing_status=ProcessingStatus.PROCESSING,
+        updated_at__lt=cutoff
+    ).values_list('id', flat=True))
+    for practice_session_id in stuck_ids:
+        logger.warning(f"Practice session {practice_session_id} stuck in processing, marking it failed")
+        mark_failed(practice_session_id)
+    return len(stuck_ids)
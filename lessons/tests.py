@@ -1,3 +1,98 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from knox.models import AuthToken
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import Lesson, LessonAssignment, PracticeSession
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryCountTests(APITestCase):
+    """The lesson and practice session endpoints run a fixed number of
+    queries however many sessions there are. The counts include the two
+    that Knox token authentication runs on every request."""
+
+    SESSIONS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='teacher@example.com', password='password')
+        cls.student = User.objects.create_user(email='student@example.com', password='password')
+        cls.lesson = Lesson.objects.create(
+            name='Scales in G',
+            category='scales',
+            instructions='Two octaves, hands together.',
+            frequency='daily',
+            created_by=cls.teacher
+        )
+        LessonAssignment.objects.create(
+            lesson=cls.lesson,
+            assigned_by=cls.teacher,
+            assigned_to=cls.student
+        )
+        cls.sessions = PracticeSession.objects.bulk_create([
+            PracticeSession(lesson=cls.lesson, user=cls.student, difficulty=difficulty)
+            for difficulty in range(1, cls.SESSIONS + 1)
+        ])
+
+    def authenticate(self, user):
+        _, token = AuthToken.objects.create(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertGetNumQueries(self, num, url, data=None):
+        with self.assertNumQueries(num):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_practice_session_list(self):
+        self.authenticate(self.student)
+        response = self.assertGetNumQueries(
+            4, reverse('lesson-practice-list', args=[self.lesson.pk])
+        )
+        self.assertEqual(len(response.data), self.SESSIONS)
+
+    def test_practice_session_retrieve_as_author(self):
+        self.authenticate(self.student)
+        response = self.assertGetNumQueries(
+            4, reverse('lesson-practice-detail', args=[self.lesson.pk, self.sessions[0].pk])
+        )
+        self.assertEqual(response.data['id'], self.sessions[0].pk)
+
+    def test_practice_session_retrieve_as_assigner(self):
+        self.authenticate(self.teacher)
+        response = self.assertGetNumQueries(
+            4, reverse('lesson-practice-detail', args=[self.lesson.pk, self.sessions[0].pk])
+        )
+        self.assertEqual(response.data['id'], self.sessions[0].pk)
+
+    def test_practice_session_by_user_as_assigner(self):
+        self.authenticate(self.teacher)
+        response = self.assertGetNumQueries(
+            4, reverse('lesson-practice-by-user', args=[self.lesson.pk]),
+            {'user_id': self.student.pk}
+        )
+        self.assertEqual(len(response.data), self.SESSIONS)
+
+    def test_lesson_practice_sessions(self):
+        self.authenticate(self.teacher)
+        response = self.assertGetNumQueries(
+            6, reverse('lesson-practice-sessions', args=[self.lesson.pk])
+        )
+        self.assertEqual(len(response.data['results']), self.SESSIONS)
+
+    def test_lesson_list(self):
+        # The lesson nests the user's own sessions
+        self.authenticate(self.student)
+        response = self.assertGetNumQueries(6, reverse('lesson-list'))
+        self.assertEqual(len(response.data), 1)
+
+    def test_lesson_retrieve(self):
+        # The lesson nests the user's own sessions
+        self.authenticate(self.student)
+        response = self.assertGetNumQueries(6, reverse('lesson-detail', args=[self.lesson.pk]))
+        self.assertEqual(response.data['id'], self.lesson.pk)
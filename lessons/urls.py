@@ -6,6 +6,7 @@ from .views import (
     LessonAssignmentRequestViewSet,
     create_lesson_request,
     accept_lesson_request,
+    accept_lesson_requests,
     reject_lesson_request
 )
 
@@ -27,12 +28,19 @@ urlpatterns = [
     path('<int:lesson_id>/practice/<int:pk>/upload_audio/', PracticeSessionViewSet.as_view({
         'post': 'upload_audio'
     }), name='lesson-practice-upload-audio'),
+    path('<int:lesson_id>/practice/<int:pk>/analysis/', PracticeSessionViewSet.as_view({
+        'get': 'analysis'
+    }), name='lesson-practice-analysis'),
+    path('<int:lesson_id>/practice/<int:pk>/events/', PracticeSessionViewSet.as_view({
+        'get': 'events'
+    }, **PracticeSessionViewSet.events.kwargs), name='lesson-practice-events'),
     path('<int:lesson_id>/practice/by_user/', PracticeSessionViewSet.as_view({
         'get': 'by_user'
     }), name='lesson-practice-by-user'),
     # Lesson request endpoints
     path('requests/create/', create_lesson_request, name='lesson-request-create'),
     path('requests/<int:pk>/accept/', accept_lesson_request, name='lesson-request-accept'),
+    path('requests/accept/', accept_lesson_requests, name='lesson-request-accept-many'),
     path('requests/<int:pk>/reject/', reject_lesson_request, name='lesson-request-reject'),
     path('requests/received/', LessonAssignmentRequestViewSet.as_view({
         'get': 'received'
@@ -1,30 +1,76 @@
+import os
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, views
 from rest_framework.decorators import action, api_view
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from .models import Lesson, LessonAssignment, PracticeSession, LessonAssignmentRequest
 from contacts.models import Contact
 from .serializers import (
     LessonSerializer, 
+    LessonListSerializer,
     LessonAssignmentSerializer,
     PracticeSessionSerializer,
-    LessonAssignmentRequestSerializer
+    LessonAssignmentRequestSerializer,
+    PRACTICE_SESSION_LIST_COLUMNS
 )
-from django.db import models
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, models, transaction
 from .tasks import process_practice_session_file
-from django.http import Http404
+from .events import EventStreamRenderer, stream_status
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from accounts.models import CustomUser
 
 # Create your views here.
 
-class PracticeSessionViewSet(viewsets.ModelViewSet):
+class PracticeSessionPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+class LessonAssignmentPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+class AudioUploadMixin:
+    """
+    Streams the files of the audio upload actions to a temporary file
+    instead of reading them into memory first; the file storage then moves
+    that file into place rather than copying it chunk by chunk.
+    """
+    audio_upload_actions = ('upload_audio',)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Upload handlers have to be set before the body is parsed
+        if self.action_map.get(request.method.lower()) in self.audio_upload_actions:
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+class PracticeSessionViewSet(AudioUploadMixin, viewsets.ModelViewSet):
     serializer_class = PracticeSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         lesson_id = self.kwargs.get('lesson_id')
         # Return all practice sessions for the lesson
-        return PracticeSession.objects.filter(lesson_id=lesson_id)
+        queryset = PracticeSession.objects.filter(lesson_id=lesson_id)
+        if self.action == 'list':
+            queryset = PracticeSessionSerializer.setup_list_loading(queryset)
+        else:
+            # The lesson and user the serializer, upload_audio and
+            # get_object's access check read, with the access check itself
+            queryset = queryset.select_related('lesson', 'user').annotate(
+                is_assigner=models.Exists(LessonAssignment.objects.filter(
+                    lesson=models.OuterRef('lesson'),
+                    assigned_by=self.request.user,
+                    assigned_to=models.OuterRef('user')
+                ))
+            )
+        return queryset
 
     def get_object(self):
         # Get the practice session
@@ -33,12 +79,7 @@ class PracticeSessionViewSet(viewsets.ModelViewSet):
         # Check if the current user is either:
         # 1. The author of the practice session, or
         # 2. The assigner of the lesson to the practice session's user
-        if (practice_session.user == self.request.user or
-            LessonAssignment.objects.filter(
-                lesson=practice_session.lesson,
-                assigned_by=self.request.user,
-                assigned_to=practice_session.user
-            ).exists()):
+        if practice_session.user_id == self.request.user.id or practice_session.is_assigner:
             return practice_session
             
         # If neither condition is met, raise 404
@@ -54,10 +95,10 @@ class PracticeSessionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_lesson(self, request, lesson_id=None):
         # Only return practice sessions for the current user
-        practice_sessions = PracticeSession.objects.filter(
+        practice_sessions = PracticeSessionSerializer.setup_list_loading(PracticeSession.objects.filter(
             user=request.user,
             lesson_id=lesson_id
-        )
+        ))
         serializer = self.get_serializer(practice_sessions, many=True)
         return Response(serializer.data)
 
@@ -70,23 +111,26 @@ class PracticeSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if the current user has assigned this lesson to the requested user
+        # Only if the current user has assigned this lesson to the requested user
         has_assigned = LessonAssignment.objects.filter(
             lesson_id=lesson_id,
             assigned_by=request.user,
             assigned_to_id=user_id
-        ).exists()
+        )
         
-        if not has_assigned:
+        # The check is part of the sessions query; only an empty result needs
+        # it run on its own, to tell "no sessions" from "not allowed"
+        practice_sessions = list(PracticeSessionSerializer.setup_list_loading(PracticeSession.objects.filter(
+            models.Exists(has_assigned),
+            user_id=user_id,
+            lesson_id=lesson_id
+        )))
+        if not practice_sessions and not has_assigned.exists():
             return Response(
                 {'error': 'You can only view practice sessions of users you have assigned this lesson to'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        practice_sessions = PracticeSession.objects.filter(
-            user_id=user_id,
-            lesson_id=lesson_id
-        )
         serializer = self.get_serializer(practice_sessions, many=True)
         return Response(serializer.data)
 
@@ -97,30 +141,89 @@ class PracticeSessionViewSet(viewsets.ModelViewSet):
             practice_session.audio = request.FILES['audio']
             practice_session.save()
             
-            # Get the relative paths of both files
-            practice_audio_path = practice_session.audio.name
+            # Get the relative path of the lesson's file
             lesson_audio_path = practice_session.lesson.audio.name if practice_session.lesson.audio else None
             
             # Call the Celery task to process both files
-            process_practice_session_file.delay(practice_audio_path, lesson_audio_path)
+            result = process_practice_session_file.delay(practice_session.pk, lesson_audio_path)
             
             return Response({
                 'status': 'audio uploaded',
-                'message': 'File is being processed'
+                'message': 'File is being processed',
+                'task_id': result.id
             })
         return Response({'status': 'no audio provided'}, status=400)
 
-class LessonViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def analysis(self, request, lesson_id=None, pk=None):
+        # Aligned pitch/chroma series from the comparison, for charting
+        practice_session = self.get_object()
+        results_dir = (practice_session.processing_results or {}).get('results_dir')
+        if not results_dir:
+            raise Http404("No analysis available for this practice session")
+        
+        import numpy as np
+        from .audio_compare import ANALYSIS_ARRAYS_FILENAME
+        
+        try:
+            arrays = np.load(os.path.join(results_dir, ANALYSIS_ARRAYS_FILENAME))
+        except FileNotFoundError:
+            raise Http404("No analysis available for this practice session")
+        
+        with arrays:
+            return Response({
+                'pitch_diffs': arrays['pitch_diffs'].tolist(),
+                'aligned_times': arrays['aligned_times'].tolist(),
+                'chroma_diffs': arrays['chroma_diffs'].tolist(),
+                'warping_path': arrays['wp'].tolist(),
+            })
+
+    @action(
+        detail=True,
+        methods=['get'],
+        renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+    )
+    def events(self, request, lesson_id=None, pk=None):
+        # Processing status as Server-Sent Events, until it completes or fails
+        practice_session = self.get_object()
+        
+        def get_status():
+            return PracticeSession.objects.values_list('processing_status', flat=True).get(pk=practice_session.pk)
+        
+        response = StreamingHttpResponse(
+            stream_status(practice_session.pk, get_status),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Don't let nginx buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class LessonViewSet(AudioUploadMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # Return lessons created by the current user OR assigned to the current user
-        return Lesson.objects.filter(
+        # Return lessons created by the current user OR assigned to the current user.
+        # The assignments go in a subquery rather than a join, so lessons
+        # don't come back once per assignment and need no DISTINCT.
+        queryset = Lesson.objects.filter(
             models.Q(created_by=self.request.user) |
-            models.Q(assignments__assigned_to=self.request.user)
-        ).distinct()
+            models.Q(pk__in=LessonAssignment.objects.filter(
+                assigned_to=self.request.user
+            ).values('lesson_id'))
+        )
+        # Only the actions that serialize lessons need the nested data
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            queryset = LessonSerializer.setup_eager_loading(queryset, self.request.user)
+        return queryset
+
+    def get_serializer_class(self):
+        # Lists are always eager loaded (see get_queryset and the actions)
+        if self.action in ('list', 'assigned_to_me', 'assigned_by_me'):
+            return LessonListSerializer
+        return LessonSerializer
 
     def perform_create(self, serializer):
         serializer.save()
@@ -134,42 +237,60 @@ class LessonViewSet(viewsets.ModelViewSet):
         )
         
         if serializer.is_valid():
-            # Check if the lesson is already assigned to this user
-            if LessonAssignment.objects.filter(
-                lesson=lesson,
-                assigned_to=serializer.validated_data['assigned_to']
-            ).exists():
+            # Add the lesson to the validated data
+            serializer.validated_data['lesson'] = lesson
+            # unique_together rejects a lesson that is already assigned to
+            # this user, without a separate lookup first
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
                 return Response(
                     {'error': 'This lesson is already assigned to this user'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # Add the lesson to the validated data
-            serializer.validated_data['lesson'] = lesson
-            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['get'])
     def assignments(self, request, pk=None):
+        # The lesson's assignments, a page at a time
         lesson = self.get_object()
-        assignments = lesson.assignments.all()
-        serializer = LessonAssignmentSerializer(assignments, many=True)
-        return Response(serializer.data)
+        assignments = lesson.assignments.select_related('assigned_to').order_by('id')
+        paginator = LessonAssignmentPagination()
+        page = paginator.paginate_queryset(assignments, request, view=self)
+        serializer = LessonAssignmentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def practice_sessions(self, request, pk=None):
+        # All users' practice sessions for the lesson, a page at a time
+        lesson = self.get_object()
+        practice_sessions = lesson.practice_sessions.select_related('user').only(*PRACTICE_SESSION_LIST_COLUMNS)
+        paginator = PracticeSessionPagination()
+        page = paginator.paginate_queryset(practice_sessions, request, view=self)
+        serializer = PracticeSessionSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def assigned_to_me(self, request):
-        assigned_lessons = Lesson.objects.filter(
-            assignments__assigned_to=request.user
-        ).distinct()
+        assigned_lessons = LessonSerializer.setup_eager_loading(
+            # unique_together allows one assignment per lesson and user, so
+            # the join can't repeat a lesson
+            Lesson.objects.filter(assignments__assigned_to=request.user),
+            request.user
+        )
         serializer = self.get_serializer(assigned_lessons, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def assigned_by_me(self, request):
-        assigned_lessons = Lesson.objects.filter(
-            assignments__assigned_by=request.user
-        ).distinct()
+        assigned_lessons = LessonSerializer.setup_eager_loading(
+            Lesson.objects.filter(pk__in=LessonAssignment.objects.filter(
+                assigned_by=request.user
+            ).values('lesson_id')),
+            request.user
+        )
         serializer = self.get_serializer(assigned_lessons, many=True)
         return Response(serializer.data)
 
@@ -197,11 +318,12 @@ class LessonAssignmentRequestViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options']
 
     def get_queryset(self):
-        # Return requests sent by or received by the current user
-        return LessonAssignmentRequest.objects.filter(
+        # Return requests sent by or received by the current user; both are
+        # plain foreign keys, so no request can come back twice
+        return LessonAssignmentRequestSerializer.setup_eager_loading(LessonAssignmentRequest.objects.filter(
             models.Q(requested_by=self.request.user) |
             models.Q(requested_to=self.request.user)
-        ).distinct()
+        ))
 
     def perform_create(self, serializer):
         serializer.save(requested_by=self.request.user)
@@ -232,28 +354,28 @@ class LessonAssignmentRequestViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def sent(self, request):
-        sent_requests = LessonAssignmentRequest.objects.filter(
+        sent_requests = LessonAssignmentRequestSerializer.setup_eager_loading(LessonAssignmentRequest.objects.filter(
             requested_by=request.user
-        )
+        ))
         serializer = self.get_serializer(sent_requests, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def received(self, request):
-        received_requests = LessonAssignmentRequest.objects.filter(
+        received_requests = LessonAssignmentRequestSerializer.setup_eager_loading(LessonAssignmentRequest.objects.filter(
             requested_to=request.user,
-            status='pending'
-        )
+            status=LessonAssignmentRequest.Status.PENDING
+        ))
         serializer = self.get_serializer(received_requests, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def assigned_to_me(self, request):
         # Get all accepted requests that were assigned to me
-        assigned_requests = LessonAssignmentRequest.objects.filter(
+        assigned_requests = LessonAssignmentRequestSerializer.setup_eager_loading(LessonAssignmentRequest.objects.filter(
             requested_to=request.user,
-            status='accepted'
-        )
+            status=LessonAssignmentRequest.Status.ACCEPTED
+        ))
         serializer = self.get_serializer(assigned_requests, many=True)
         return Response(serializer.data)
 
@@ -278,24 +400,38 @@ def create_lesson_request(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Look up the lesson
-    try:
-        lesson = Lesson.objects.get(id=lesson_id)
-    except Lesson.DoesNotExist:
-        return Response(
-            {"error": f"Lesson with ID {lesson_id} not found"},
-            status=status.HTTP_404_NOT_FOUND
-        )
+    lesson_not_found = Response(
+        {"error": f"Lesson with ID {lesson_id} not found"},
+        status=status.HTTP_404_NOT_FOUND
+    )
     
-    # Look up the user
+    # Look up the user, together with the lesson, assignment and pending
+    # request checks, in a single query
     try:
-        requested_to = CustomUser.objects.get(id=requested_to_id)
+        requested_to = CustomUser.objects.annotate(
+            lesson_exists=models.Exists(Lesson.objects.filter(id=lesson_id)),
+            is_assigned=models.Exists(LessonAssignment.objects.filter(
+                lesson_id=lesson_id,
+                assigned_to=models.OuterRef('pk')
+            )),
+            has_pending=models.Exists(LessonAssignmentRequest.objects.filter(
+                lesson_id=lesson_id,
+                requested_to=models.OuterRef('pk'),
+                status=LessonAssignmentRequest.Status.PENDING
+            ))
+        ).get(id=requested_to_id)
     except CustomUser.DoesNotExist:
+        # A missing lesson is reported first
+        if not Lesson.objects.filter(id=lesson_id).exists():
+            return lesson_not_found
         return Response(
             {"error": f"User with ID {requested_to_id} not found"},
             status=status.HTTP_404_NOT_FOUND
         )
     
+    if not requested_to.lesson_exists:
+        return lesson_not_found
+    
     # Check if this is a request to yourself
     if requested_to.id == request.user.id:
         return Response(
@@ -304,25 +440,14 @@ def create_lesson_request(request):
         )
     
     # Check if the lesson is already assigned
-    existing_assignment = LessonAssignment.objects.filter(
-        lesson=lesson,
-        assigned_to=requested_to
-    ).exists()
-    
-    if existing_assignment:
+    if requested_to.is_assigned:
         return Response(
             {"error": "This lesson is already assigned to this user"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     # Check if there's a pending request already
-    existing_request = LessonAssignmentRequest.objects.filter(
-        lesson=lesson,
-        requested_to=requested_to,
-        status='pending'
-    ).exists()
-    
-    if existing_request:
+    if requested_to.has_pending:
         return Response(
             {"error": "A pending request already exists for this lesson and user"},
             status=status.HTTP_400_BAD_REQUEST
@@ -335,7 +460,22 @@ def create_lesson_request(request):
     )
     
     if serializer.is_valid():
-        serializer.save(requested_by=request.user)
+        # The checks above already cover what the model's clean() would look
+        # up again; the only thing left to trip over is an earlier, already
+        # answered request for the same pair (unique_together)
+        assignment_request = LessonAssignmentRequest(
+            requested_by=request.user,
+            **serializer.validated_data
+        )
+        try:
+            with transaction.atomic():
+                assignment_request.save(validate=False)
+        except IntegrityError:
+            return Response(
+                {"error": "A request for this lesson was already sent to this user"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer.instance = assignment_request
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -344,37 +484,60 @@ def accept_lesson_request(request, pk):
     """
     Accept a lesson assignment request.
     """
-    try:
-        assignment_request = LessonAssignmentRequest.objects.get(
-            id=pk,
-            requested_to=request.user,
-            status='pending'
-        )
-    except LessonAssignmentRequest.DoesNotExist:
+    # The recipient and status checks are part of bulk_accept's locked
+    # UPDATE, so concurrent accept/reject calls can't both get through
+    accepted = LessonAssignmentRequest.bulk_accept(
+        LessonAssignmentRequest.objects.filter(id=pk, requested_to=request.user)
+    )
+    if not accepted:
         return Response(
             {"error": "Request not found or not in pending state"},
             status=status.HTTP_404_NOT_FOUND
         )
     
-    assignment_request.accept()
     return Response({"status": "request accepted"})
 
 @api_view(['POST'])
-def reject_lesson_request(request, pk):
+def accept_lesson_requests(request):
     """
-    Reject a lesson assignment request.
+    Accept several pending lesson assignment requests at once.
     """
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return Response(
+            {"error": "A list of request IDs is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
     try:
-        assignment_request = LessonAssignmentRequest.objects.get(
-            id=pk,
-            requested_to=request.user,
-            status='pending'
+        ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        return Response(
+            {"error": "Request IDs must be integers"},
+            status=status.HTTP_400_BAD_REQUEST
         )
-    except LessonAssignmentRequest.DoesNotExist:
+    
+    # Only requests sent to the current user can be accepted
+    accepted = LessonAssignmentRequest.bulk_accept(
+        LessonAssignmentRequest.objects.filter(id__in=ids, requested_to=request.user)
+    )
+    return Response({"status": "requests accepted", "accepted": accepted})
+
+@api_view(['POST'])
+def reject_lesson_request(request, pk):
+    """
+    Reject a lesson assignment request.
+    """
+    # Recipient and status checks are folded into the UPDATE itself
+    updated = LessonAssignmentRequest.objects.filter(
+        id=pk,
+        requested_to=request.user,
+        status=LessonAssignmentRequest.Status.PENDING
+    ).update(status=LessonAssignmentRequest.Status.REJECTED, updated_at=timezone.now())
+    if not updated:
         return Response(
             {"error": "Request not found or not in pending state"},
             status=status.HTTP_404_NOT_FOUND
         )
     
-    assignment_request.reject()
     return Response({"status": "request rejected"})